@@ -0,0 +1,107 @@
+"""
+Agrégation des transactions par intervalles de temps arbitraires.
+
+Les montants sont agrégés en une seule requête SQL groupée (tables chaudes et
+partitions d'archive concernées réunies par UNION ALL), au grain du jour ou du
+mois, puis regroupés en intervalles et complétés (intervalles vides à 0) en
+Python pour produire des séries denses.
+"""
+
+from datetime import date
+
+from sqlalchemy import select, union_all, literal, func, extract
+
+import archive
+from models import Income, Expense
+
+BUCKETS = ("day", "week", "month", "quarter", "year")
+GROUP_BY = ("category", "kind")
+KIND_MODELS = {"income": Income, "expense": Expense}
+MAX_BUCKETS = 1000
+
+
+def bucket_index(day, bucket):
+    """Numéro d'intervalle croissant et contigu contenant `day`."""
+    if bucket == "day":
+        return day.toordinal()
+    if bucket == "week":
+        # L'ordinal 1 (0001-01-01) est un lundi : semaines du lundi au dimanche
+        return (day.toordinal() - 1) // 7
+    if bucket == "month":
+        return day.year * 12 + day.month - 1
+    if bucket == "quarter":
+        return day.year * 4 + (day.month - 1) // 3
+    return day.year
+
+
+def bucket_start(index, bucket):
+    """Premier jour de l'intervalle `index` (inverse de bucket_index)."""
+    if bucket == "day":
+        return date.fromordinal(index)
+    if bucket == "week":
+        return date.fromordinal(index * 7 + 1)
+    if bucket == "month":
+        return date(index // 12, index % 12 + 1, 1)
+    if bucket == "quarter":
+        return date(index // 4, (index % 4) * 3 + 1, 1)
+    return date(index, 1, 1)
+
+
+def bucket_count(start, end, bucket):
+    return bucket_index(end, bucket) - bucket_index(start, bucket) + 1
+
+
+def _sources(db, user_id, start, end, kinds):
+    years = archive.archived_years(db, start, end)
+    sources = []
+    for kind in kinds:
+        model = KIND_MODELS[kind]
+        tables = [(model, None)]
+        if years:
+            tables.append((archive.ARCHIVE_MODELS[model], years))
+        for table, table_years in tables:
+            query = select(
+                literal(kind).label("kind"),
+                table.date.label("date"),
+                table.category.label("category"),
+                table.amount.label("amount")
+            ).where(table.user_id == user_id, table.date >= start, table.date <= end)
+            if table_years is not None:
+                query = query.where(table.year.in_(table_years))
+            sources.append(query)
+    return sources
+
+
+def aggregate(db, user_id, start, end, bucket="month", group_by="kind", kinds=("income", "expense")):
+    """Séries denses des montants par intervalle.
+
+    Renvoie (périodes, séries) : la liste des débuts d'intervalle, et une liste
+    de dictionnaires {kind, category, values} alignés sur ces périodes.
+    """
+    base = bucket_index(start, bucket)
+    n_buckets = bucket_count(start, end, bucket)
+    periods = [bucket_start(base + i, bucket) for i in range(n_buckets)]
+
+    sources = _sources(db, user_id, start, end, kinds)
+    rows = union_all(*sources).subquery()
+    # Grain SQL : le jour pour day / week, le mois au-delà
+    if bucket in ("day", "week"):
+        grain = [rows.c.date]
+    else:
+        grain = [extract("year", rows.c.date), extract("month", rows.c.date)]
+    groups = [rows.c.kind] if group_by == "kind" else [rows.c.kind, rows.c.category]
+    query = select(*grain, *groups, func.sum(rows.c.amount)).group_by(*grain, *groups)
+
+    series = {key: [0.0] * n_buckets for key in ((kind,) for kind in kinds)} if group_by == "kind" else {}
+    for row in db.execute(query):
+        if bucket in ("day", "week"):
+            day, key, amount = row[0], tuple(row[1:-1]), row[-1]
+        else:
+            day, key, amount = date(int(row[0]), int(row[1]), 1), tuple(row[2:-1]), row[-1]
+        values = series.setdefault(key, [0.0] * n_buckets)
+        values[bucket_index(day, bucket) - base] += float(amount or 0)
+
+    return periods, [
+        {"kind": key[0], "category": key[1] if len(key) > 1 else None, "values": values}
+        for key, values in sorted(series.items())
+    ]
@@ -0,0 +1,171 @@
+"""
+Archivage par année des revenus et dépenses.
+
+Les années closes sont déplacées des tables chaudes (`incomes`, `expenses`)
+vers les tables d'archive, et leurs totaux par utilisateur / catégorie sont
+précalculés dans `yearly_totals`. Les requêtes bornées par date ne lisent
+les archives que pour les années archivées qui recoupent l'intervalle.
+
+Usage :
+    python archive.py 2023          # archive l'année 2023
+    python archive.py --before 2025 # archive toutes les années < 2025
+"""
+
+import sys
+from datetime import date
+
+from sqlalchemy import func, select, insert, delete, literal
+
+from database import SessionLocal, engine, Base
+from models import Income, Expense, IncomeArchive, ExpenseArchive, YearlyTotal, ArchivedYear
+
+ARCHIVE_MODELS = {Income: IncomeArchive, Expense: ExpenseArchive}
+KINDS = {Income: "income", Expense: "expense"}
+
+
+def year_bounds(year):
+    return date(year, 1, 1), date(year, 12, 31)
+
+
+def archived_years(db, start=None, end=None):
+    """Années archivées qui recoupent l'intervalle [start, end]."""
+    query = db.query(ArchivedYear.year)
+    if start is not None:
+        query = query.filter(ArchivedYear.year >= start.year)
+    if end is not None:
+        query = query.filter(ArchivedYear.year <= end.year)
+    return sorted(year for (year,) in query.all())
+
+
+def _date_filters(column, start, end):
+    filters = []
+    if start is not None:
+        filters.append(column >= start)
+    if end is not None:
+        filters.append(column <= end)
+    return filters
+
+
+def total_amount(db, model, user_id, start=None, end=None):
+    """Somme des montants de l'utilisateur sur [start, end], archives comprises."""
+    total = db.query(func.sum(model.amount)).filter(
+        model.user_id == user_id, *_date_filters(model.date, start, end)
+    ).scalar() or 0
+
+    archive = ARCHIVE_MODELS[model]
+    full_years = []
+    for year in archived_years(db, start, end):
+        first, last = year_bounds(year)
+        if (start is None or start <= first) and (end is None or end >= last):
+            # Année entièrement couverte : total précalculé
+            full_years.append(year)
+        else:
+            # Année partiellement couverte : lecture de la seule partition utile
+            total += db.query(func.sum(archive.amount)).filter(
+                archive.user_id == user_id,
+                archive.year == year,
+                *_date_filters(archive.date, start, end)
+            ).scalar() or 0
+
+    if full_years:
+        total += db.query(func.sum(YearlyTotal.total)).filter(
+            YearlyTotal.user_id == user_id,
+            YearlyTotal.kind == KINDS[model],
+            YearlyTotal.year.in_(full_years)
+        ).scalar() or 0
+
+    return total
+
+
+def iter_rows(db, model, user_id, start=None, end=None):
+    """Parcourt les lignes de l'utilisateur, archives puis table chaude."""
+    archive = ARCHIVE_MODELS[model]
+    years = archived_years(db, start, end)
+    if years:
+        query = db.query(archive).filter(
+            archive.user_id == user_id,
+            archive.year.in_(years),
+            *_date_filters(archive.date, start, end)
+        ).order_by(archive.date)
+        yield from query.yield_per(1000)
+    query = db.query(model).filter(model.user_id == user_id, *_date_filters(model.date, start, end))
+    yield from query.yield_per(1000)
+
+
+def archive_year(db, year):
+    """Déplace l'année `year` vers les archives et recalcule ses totaux."""
+    if year >= date.today().year:
+        raise ValueError(f"L'année {year} n'est pas close")
+
+    first, last = year_bounds(year)
+    moved = 0
+    for model, archive in ARCHIVE_MODELS.items():
+        # DELETE ... RETURNING : seules les lignes effectivement supprimées sont
+        # archivées, même si une ligne de l'année est validée entre-temps
+        # (READ COMMITTED sous PostgreSQL)
+        table = model.__table__
+        deleted = db.execute(
+            delete(table).where(model.date >= first, model.date <= last).returning(*table.columns)
+        ).mappings().all()
+        # L'archive a sa propre clé : l'identifiant d'origine est conservé à part
+        rows = [
+            dict({name: value for name, value in row.items() if name != "id"}, original_id=row["id"], year=year)
+            for row in deleted
+        ]
+        if rows:
+            db.execute(insert(archive.__table__), rows)
+        moved += len(rows)
+
+        # Totaux recalculés depuis la partition pour rester idempotent
+        db.execute(delete(YearlyTotal.__table__).where(
+            YearlyTotal.year == year, YearlyTotal.kind == KINDS[model]
+        ))
+        totals = select(
+            archive.user_id,
+            literal(year),
+            literal(KINDS[model]),
+            archive.category,
+            func.sum(archive.amount),
+            func.count(archive.id)
+        ).where(archive.year == year).group_by(archive.user_id, archive.category)
+        db.execute(insert(YearlyTotal.__table__).from_select(
+            ["user_id", "year", "kind", "category", "total", "count"], totals
+        ))
+
+    if db.get(ArchivedYear, year) is None:
+        db.add(ArchivedYear(year=year))
+    db.commit()
+    return moved
+
+
+def main(argv):
+    if len(argv) == 2 and argv[0] == "--before":
+        before = int(argv[1])
+    elif len(argv) == 1:
+        before = None
+        years = [int(argv[0])]
+    else:
+        print(__doc__)
+        return 1
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if before is not None:
+            found = db.query(func.min(Income.date)).scalar(), db.query(func.min(Expense.date)).scalar()
+            oldest = min((d for d in found if d is not None), default=None)
+            years = range(oldest.year, before) if oldest else []
+        for year in years:
+            try:
+                moved = archive_year(db, year)
+            except ValueError as e:
+                print(e)
+                return 1
+            print(f"{year} : {moved} transactions archivées")
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,12 +1,52 @@
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./finance.db"
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./finance.db")
+# Base de lecture (réplique). Par défaut : connexion SQLite en lecture seule sur le même fichier
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL")
 
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
 )
+
+
+def _read_engine():
+    if READ_DATABASE_URL:
+        url = make_url(READ_DATABASE_URL)
+    else:
+        url = make_url(SQLALCHEMY_DATABASE_URL)
+        if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+            return engine
+        url = url.set(database=f"file:{url.database}", query={"mode": "ro", "uri": "true"})
+    if url.get_backend_name() == "sqlite":
+        return create_engine(url, connect_args={"check_same_thread": False})
+    return create_engine(url)
+
+
+read_engine = _read_engine()
+
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _enable_wal(dbapi_connection, connection_record):
+        # WAL : les lecteurs ne bloquent pas l'écrivain (et inversement)
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.close()
+
+if read_engine is not engine and read_engine.dialect.name == "sqlite":
+    @event.listens_for(read_engine, "connect")
+    def _query_only(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 Base = declarative_base()
@@ -0,0 +1,137 @@
+"""
+File d'écriture groupée pour l'ingestion à haut débit des transactions.
+
+Chaque création simple (revenu / dépense) est déposée dans une file en mémoire.
+Un thread écrivain la vide par lots et valide chaque lot en un seul commit
+(un seul fsync SQLite pour N lignes). La requête appelante attend que son lot
+soit validé et reçoit l'objet persistant avec son identifiant : les routes
+asynchrones attendent le Future sans occuper de thread, ce qui permet à un lot
+de regrouper bien plus de lignes que le pool de threads n'en compte.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from database import SessionLocal
+
+# Mode optionnel, désactivé par défaut
+COALESCE_WRITES = os.getenv("COALESCE_WRITES", "0") == "1"
+COALESCE_MAX_ROWS = int(os.getenv("COALESCE_MAX_ROWS", "500"))
+COALESCE_MAX_DELAY_MS = int(os.getenv("COALESCE_MAX_DELAY_MS", "10"))
+# Attente maximale d'une requête avant d'abandonner (thread écrivain bloqué...)
+COALESCE_TIMEOUT_SECONDS = float(os.getenv("COALESCE_TIMEOUT_SECONDS", "30"))
+
+
+class WriteCoalescer:
+    def __init__(self, session_factory=SessionLocal, max_rows=COALESCE_MAX_ROWS, max_delay_ms=COALESCE_MAX_DELAY_MS):
+        self.session_factory = session_factory
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000.0
+        # Fonction (session, objets) appelée avant chaque commit, dans la même transaction
+        self.before_commit = None
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="write-coalescer", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Vide la file puis arrête le thread écrivain."""
+        with self._lock:
+            if self._thread is None:
+                return
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, model, values):
+        """Ajoute une ligne à la file et renvoie un Future résolu après le commit."""
+        self.start()
+        future = Future()
+        self._queue.put((model, values, future))
+        return future
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay
+            stop = False
+            while len(batch) < self.max_rows:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+            if stop:
+                # Traiter ce qui reste dans la file avant de s'arrêter
+                pending = []
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not None:
+                        pending.append(item)
+                if pending:
+                    self._flush(pending)
+                return
+
+    def _flush(self, batch):
+        # Les lignes dont la requête a abandonné l'attente ne sont pas écrites ;
+        # les autres ne peuvent plus être annulées
+        batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        db = self.session_factory(expire_on_commit=False)
+        try:
+            instances = [model(**values) for model, values, _ in batch]
+            db.add_all(instances)
+            if self.before_commit is not None:
+                self.before_commit(db, instances)
+            db.commit()
+        except Exception:
+            db.rollback()
+            db.close()
+            # Un élément invalide ne doit pas faire échouer tout le lot :
+            # on repasse en commits unitaires pour isoler l'erreur.
+            self._flush_one_by_one(batch)
+            return
+        db.close()
+        for instance, (_, _, future) in zip(instances, batch):
+            future.set_result(instance)
+
+    def _flush_one_by_one(self, batch):
+        for model, values, future in batch:
+            db = self.session_factory(expire_on_commit=False)
+            try:
+                instance = model(**values)
+                db.add(instance)
+                if self.before_commit is not None:
+                    self.before_commit(db, [instance])
+                db.commit()
+                future.set_result(instance)
+            except Exception as e:
+                db.rollback()
+                future.set_exception(e)
+            finally:
+                db.close()
+
+
+coalescer = WriteCoalescer()
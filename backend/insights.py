@@ -0,0 +1,268 @@
+"""
+Analyse vectorisée de l'historique des dépenses (NumPy).
+
+L'historique complet d'un utilisateur (tables chaudes et archives) est chargé
+en une seule requête sous forme de tableaux, puis toutes les statistiques sont
+calculées sans boucle Python sur les transactions :
+
+- moyennes / écarts-types glissants mensuels par catégorie
+- mois et transactions anormaux
+- dépenses récurrentes (abonnements, loyers...)
+- prévision du mois suivant par catégorie
+
+Les résultats sont mis en cache par utilisateur, associés à la version de ses
+données (`data_versions`, incrémentée dans la transaction de chaque écriture) :
+une écriture faite par n'importe quel worker rend le cache obsolète partout.
+"""
+
+import threading
+from datetime import date
+
+import numpy as np
+from sqlalchemy import select, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import Expense, ExpenseArchive, DataVersion
+
+ROLLING_WINDOW = 3        # mois glissants pour les moyennes / écarts-types
+MONTH_Z_THRESHOLD = 2.0   # seuil d'anomalie mensuelle
+TRANSACTION_Z_THRESHOLD = 3.0
+MIN_CATEGORY_SIZE = 5     # transactions minimum pour juger une catégorie
+FORECAST_MONTHS = 6       # mois complets utilisés pour la prévision
+MAX_ANOMALIES = 50
+MAX_CACHED_USERS = 1000
+
+# Périodes reconnues pour les dépenses récurrentes : (nom, jours min, jours max)
+RECURRING_PERIODS = [("weekly", 6, 8), ("monthly", 26, 35), ("yearly", 350, 380)]
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def touch(db, user_id):
+    """Incrémente la version des données de l'utilisateur (sans commit).
+
+    À appeler dans la transaction de toute écriture qui modifie ses dépenses.
+    """
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(DataVersion).values(user_id=user_id, version=1)
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[DataVersion.user_id],
+        set_={"version": DataVersion.version + 1}
+    ))
+
+
+def data_version(db, user_id):
+    return db.query(DataVersion.version).filter(DataVersion.user_id == user_id).scalar() or 0
+
+
+def get_insights(db, user_id):
+    today = date.today()
+    # Version lue sur la même session que les données : un résultat calculé
+    # depuis une réplique en retard reste associé à l'ancienne version
+    version = data_version(db, user_id)
+    with _cache_lock:
+        cached = _cache.get(user_id)
+    if cached is not None and cached[0] == (today, version):
+        return cached[1]
+    result = compute_insights(*load_expenses(db, user_id), today=today)
+    with _cache_lock:
+        # Évincer les entrées des jours précédents, puis les plus anciennes
+        for key in [key for key, (cache_key, _) in _cache.items() if cache_key[0] != today]:
+            del _cache[key]
+        while len(_cache) >= MAX_CACHED_USERS:
+            del _cache[next(iter(_cache))]
+        _cache[user_id] = ((today, version), result)
+    return result
+
+
+def load_expenses(db, user_id):
+    """Charge l'historique en une requête : (ids, dates, catégories, montants)."""
+    query = union_all(
+        select(Expense.id, Expense.date, Expense.category, Expense.amount).where(Expense.user_id == user_id),
+        select(ExpenseArchive.original_id, ExpenseArchive.date, ExpenseArchive.category, ExpenseArchive.amount).where(
+            ExpenseArchive.user_id == user_id
+        ),
+    )
+    rows = db.execute(query).all()
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype="datetime64[D]"), np.empty(0, dtype=object), np.empty(0)
+    ids, dates, categories, amounts = zip(*rows)
+    return (
+        np.fromiter(ids, dtype=np.int64, count=len(rows)),
+        np.array(dates, dtype="datetime64[D]"),
+        np.array(categories, dtype=object),
+        np.fromiter(amounts, dtype=np.float64, count=len(rows)),
+    )
+
+
+def _month_label(month_index):
+    return str(np.datetime64(int(month_index), "M"))
+
+
+def _rolling(matrix, window):
+    """Moyenne et écart-type des `window` mois précédant chaque colonne."""
+    zeros = np.zeros((matrix.shape[0], 1))
+    csum = np.concatenate([zeros, np.cumsum(matrix, axis=1)], axis=1)
+    csq = np.concatenate([zeros, np.cumsum(matrix ** 2, axis=1)], axis=1)
+    n_months = matrix.shape[1]
+    mean = np.full(matrix.shape, np.nan)
+    std = np.full(matrix.shape, np.nan)
+    if n_months > window:
+        sums = csum[:, window:-1] - csum[:, :-window - 1]
+        squares = csq[:, window:-1] - csq[:, :-window - 1]
+        mean[:, window:] = sums / window
+        std[:, window:] = np.sqrt(np.maximum(squares / window - mean[:, window:] ** 2, 0))
+    return mean, std
+
+
+def compute_insights(ids, dates, categories, amounts, today=None):
+    today = today or date.today()
+    current_month = np.datetime64(today, "M").astype(np.int64)
+
+    if len(ids) == 0:
+        return {"categories": [], "anomalous_months": [], "anomalous_transactions": [], "recurring": [], "forecast": []}
+
+    # Codage des catégories par dictionnaire (plus rapide que np.unique sur des chaînes)
+    index = {}
+    cat = np.fromiter((index.setdefault(c, len(index)) for c in categories), dtype=np.int64, count=len(categories))
+    names = sorted(index)
+    cat = np.array([names.index(c) for c in index], dtype=np.int64)[cat]
+    n_cats = len(names)
+
+    # Matrice catégories x mois, du premier mois de l'historique au mois courant
+    months = dates.astype("datetime64[M]").astype(np.int64)
+    first_month = min(months.min(), current_month)
+    n_months = int(max(months.max(), current_month) - first_month + 1)
+    month_pos = months - first_month
+    matrix = np.bincount(cat * n_months + month_pos, weights=amounts, minlength=n_cats * n_months)
+    matrix = matrix.reshape(n_cats, n_months)
+
+    # Statistiques glissantes mensuelles
+    mean, std = _rolling(matrix, ROLLING_WINDOW)
+    # Plancher d'écart-type : un montant habituellement constant (std nul)
+    # doit quand même pouvoir être signalé s'il s'envole
+    scale = np.maximum(std, 0.1 * mean)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        month_z = (matrix - mean) / scale
+    flagged = np.argwhere((scale > 0) & (month_z > MONTH_Z_THRESHOLD))
+    order = np.argsort(-month_z[flagged[:, 0], flagged[:, 1]])[:MAX_ANOMALIES]
+    anomalous_months = [
+        {
+            "month": _month_label(first_month + m),
+            "category": names[c],
+            "amount": float(matrix[c, m]),
+            "expected": float(mean[c, m]),
+            "z_score": float(month_z[c, m]),
+        }
+        for c, m in flagged[order]
+    ]
+
+    # Transactions anormales : score z par rapport à la catégorie
+    counts = np.bincount(cat, minlength=n_cats)
+    cat_mean = np.bincount(cat, weights=amounts, minlength=n_cats) / counts
+    cat_var = np.bincount(cat, weights=amounts ** 2, minlength=n_cats) / counts - cat_mean ** 2
+    cat_std = np.sqrt(np.maximum(cat_var, 0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tx_z = (amounts - cat_mean[cat]) / cat_std[cat]
+    eligible = (counts[cat] >= MIN_CATEGORY_SIZE) & (cat_std[cat] > 0) & (tx_z > TRANSACTION_Z_THRESHOLD)
+    idx = np.flatnonzero(eligible)
+    idx = idx[np.argsort(-tx_z[idx])][:MAX_ANOMALIES]
+    anomalous_transactions = [
+        {
+            "id": int(ids[i]),
+            "date": str(dates[i]),
+            "category": names[cat[i]],
+            "amount": float(amounts[i]),
+            "z_score": float(tx_z[i]),
+        }
+        for i in idx
+    ]
+
+    recurring = _detect_recurring(dates, cat, names, amounts)
+
+    # Prévision : régression linéaire sur les derniers mois complets
+    current_pos = int(current_month - first_month)
+    history = matrix[:, max(current_pos - FORECAST_MONTHS, 0):current_pos]
+    forecast_values = np.zeros(n_cats)
+    if history.shape[1] > 0:
+        x = np.arange(history.shape[1], dtype=np.float64)
+        x_mean = x.mean()
+        y_mean = history.mean(axis=1)
+        denom = ((x - x_mean) ** 2).sum()
+        slope = ((history - y_mean[:, None]) * (x - x_mean)).sum(axis=1) / denom if denom > 0 else np.zeros(n_cats)
+        # Le mois prochain est deux pas après le dernier mois complet
+        target = history.shape[1] + 1
+        forecast_values = np.maximum(y_mean + slope * (target - x_mean), 0)
+    next_month = _month_label(current_month + 1)
+    forecast = [
+        {"month": next_month, "category": names[c], "amount": float(forecast_values[c])}
+        for c in range(n_cats)
+    ]
+
+    current_mean = mean[:, current_pos]
+    current_std = std[:, current_pos]
+    category_stats = [
+        {
+            "category": names[c],
+            "count": int(counts[c]),
+            "average": float(cat_mean[c]),
+            "current_month": float(matrix[c, current_pos]),
+            "rolling_mean": None if np.isnan(current_mean[c]) else float(current_mean[c]),
+            "rolling_std": None if np.isnan(current_std[c]) else float(current_std[c]),
+        }
+        for c in range(n_cats)
+    ]
+
+    return {
+        "categories": category_stats,
+        "anomalous_months": anomalous_months,
+        "anomalous_transactions": anomalous_transactions,
+        "recurring": recurring,
+        "forecast": forecast,
+    }
+
+
+def _detect_recurring(dates, cat, names, amounts):
+    """Groupes (catégorie, montant) revenant à intervalle régulier."""
+    cents = np.round(amounts * 100).astype(np.int64)
+    cents -= cents.min()
+    # Clé entière unique (catégorie, montant) : bien plus rapide que unique(axis=0)
+    keys = cat.astype(np.int64) * (cents.max() + 1) + cents
+    _, group = np.unique(keys, return_inverse=True)
+    n_groups = group.max() + 1
+
+    days = dates.astype(np.int64)
+    days -= days.min()
+    order = np.argsort(group * (days.max() + 1) + days, kind="stable")
+    g = group[order]
+    d = days[order]
+    same = g[1:] == g[:-1]
+    gaps = (d[1:] - d[:-1])[same].astype(np.float64)
+    gap_group = g[1:][same]
+
+    n_gaps = np.bincount(gap_group, minlength=n_groups)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gap_mean = np.bincount(gap_group, weights=gaps, minlength=n_groups) / n_gaps
+        gap_var = np.bincount(gap_group, weights=gaps ** 2, minlength=n_groups) / n_gaps - gap_mean ** 2
+    gap_std = np.sqrt(np.maximum(gap_var, 0))
+
+    # Dernière occurrence de chaque groupe (les dates sont triées par groupe)
+    last_pos = np.flatnonzero(np.append(g[1:] != g[:-1], True))
+    last_index = order[last_pos]
+
+    recurring = []
+    for period, low, high in RECURRING_PERIODS:
+        match = (n_gaps >= 2) & (gap_mean >= low) & (gap_mean <= high) & (gap_std <= 0.2 * gap_mean)
+        for grp in np.flatnonzero(match):
+            i = last_index[grp]
+            last = dates[i]
+            recurring.append({
+                "category": names[cat[i]],
+                "amount": float(amounts[i]),
+                "period": period,
+                "occurrences": int(n_gaps[grp] + 1),
+                "last_date": str(last),
+                "next_date": str(last + np.timedelta64(int(round(gap_mean[grp])), "D")),
+            })
+    return recurring
@@ -1,21 +1,35 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+import os
+import asyncio
+import logging
+import threading
+import time
+
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Response, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
-from typing import List, Optional
+from datetime import date, datetime, timedelta
+from calendar import monthrange
+from typing import List, Literal, Optional
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 
-from database import SessionLocal, engine, Base
-from models import User, Income, Expense, Budget, SavingsGoal
+from database import SessionLocal, ReadSessionLocal, engine, Base
+from ingestion import COALESCE_WRITES, COALESCE_TIMEOUT_SECONDS, coalescer
+import archive
+import insights
+import recurring
+import aggregation
+from models import User, Income, Expense, Budget, SavingsGoal, RecurringRule, RecurringOccurrence
 from schemas import (
     UserCreate, UserResponse, Token,
     IncomeCreate, IncomeUpdate, IncomeResponse,
     ExpenseCreate, ExpenseUpdate, ExpenseResponse,
     BudgetCreate, BudgetUpdate, BudgetResponse,
     SavingsGoalCreate, SavingsGoalUpdate, SavingsGoalResponse,
-    DashboardStats, CategoryStats
+    RecurringRuleCreate, RecurringRuleUpdate, RecurringRuleResponse,
+    DashboardStats, CategoryStats, InsightsResponse, AggregateResponse
 )
 
 # Créer les tables
@@ -23,6 +37,12 @@ Base.metadata.create_all(bind=engine)
 
 app = FastAPI(title="Finance Management API", version="1.0.0")
 
+# Intervalle (secondes) entre deux matérialisations des règles récurrentes
+RECURRING_SCHEDULER_INTERVAL = int(os.getenv("RECURRING_SCHEDULER_INTERVAL", "3600"))
+stop_scheduler = threading.Event()
+# Nombre de mois projetés par GET /dashboard?project=true
+PROJECTION_MONTHS = 3
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -30,8 +50,47 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Primary-Pin"],
 )
 
+
+def touch_expense_versions(db, instances):
+    # Appelé par le thread écrivain dans la transaction de chaque lot
+    for user_id in {instance.user_id for instance in instances if isinstance(instance, Expense)}:
+        insights.touch(db, user_id)
+
+
+coalescer.before_commit = touch_expense_versions
+
+
+@app.on_event("startup")
+def start_recurring_scheduler():
+    # Rattrapage au démarrage puis passage périodique (idempotent)
+    def run():
+        while True:
+            db = SessionLocal()
+            try:
+                recurring.materialize_due(db)
+            except Exception:
+                db.rollback()
+                logging.exception("Échec de la matérialisation des transactions récurrentes")
+            finally:
+                db.close()
+            stop_scheduler.wait(RECURRING_SCHEDULER_INTERVAL)
+            if stop_scheduler.is_set():
+                return
+
+    stop_scheduler.clear()
+    threading.Thread(target=run, name="recurring-scheduler", daemon=True).start()
+
+
+@app.on_event("shutdown")
+def flush_pending_writes():
+    # Valider les écritures encore en file avant l'arrêt
+    coalescer.stop()
+    stop_scheduler.set()
+
+
 # Configuration sécurité
 SECRET_KEY = "your-secret-key-change-in-production"
 ALGORITHM = "HS256"
@@ -41,6 +100,45 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
+# Après une écriture, l'utilisateur lit sur la base principale pendant
+# PRIMARY_PIN_SECONDS pour voir ses propres écritures malgré le retard de la réplique.
+# L'échéance est renvoyée au client dans l'en-tête X-Primary-Pin, qu'il renvoie
+# sur ses requêtes suivantes : l'épinglage fonctionne ainsi quel que soit le
+# worker qui traite la lecture. Le dictionnaire local couvre les clients qui ne
+# renvoient pas l'en-tête, lorsque la lecture arrive sur le même worker.
+PRIMARY_PIN_SECONDS = float(os.getenv("PRIMARY_PIN_SECONDS", "5"))
+PRIMARY_PIN_HEADER = "X-Primary-Pin"
+primary_pins = {}
+primary_pins_lock = threading.Lock()
+
+
+def pin_to_primary(user_id, response: Optional[Response] = None):
+    expiry = time.time() + PRIMARY_PIN_SECONDS
+    with primary_pins_lock:
+        if len(primary_pins) > 10000:
+            now = time.time()
+            for key in [key for key, pinned_until in primary_pins.items() if pinned_until < now]:
+                del primary_pins[key]
+        primary_pins[str(user_id)] = expiry
+    if response is not None:
+        response.headers[PRIMARY_PIN_HEADER] = f"{expiry:.3f}"
+
+
+def is_pinned_to_primary(user_id, pin_header: Optional[str] = None):
+    now = time.time()
+    if pin_header:
+        try:
+            pinned_until = float(pin_header)
+        except ValueError:
+            pinned_until = 0
+        # Une échéance au-delà de la fenêtre normale est ignorée
+        if now <= pinned_until <= now + PRIMARY_PIN_SECONDS:
+            return True
+    with primary_pins_lock:
+        pinned_until = primary_pins.get(str(user_id))
+    return pinned_until is not None and pinned_until >= now
+
+
 # Dépendances
 def get_db():
     db = SessionLocal()
@@ -50,6 +148,40 @@ def get_db():
         db.close()
 
 
+def get_read_db(token: str = Depends(oauth2_scheme), x_primary_pin: Optional[str] = Header(None)):
+    # Session de lecture (réplique), sauf si l'utilisateur vient d'écrire
+    try:
+        user_id = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        user_id = None
+    if user_id is not None and is_pinned_to_primary(user_id, x_primary_pin):
+        db = SessionLocal()
+    else:
+        db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def wait_for_batch(model, values, db: Session):
+    # Rendre la connexion au pool pendant l'attente du lot (sans thread : les
+    # threads peuvent tous être occupés à attendre une connexion)
+    db.close()
+    # Attente sans thread : le nombre de lignes par lot n'est plus borné par le pool de threads
+    future = coalescer.submit(model, values)
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), COALESCE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        # Une ligne pas encore prise par le thread écrivain est annulée et ne sera pas écrite
+        raise HTTPException(status_code=503, detail="Délai d'écriture dépassé, réessayez")
+
+
+def month_bounds(year, month):
+    """Premier et dernier jour du mois, pour des filtres de date indexables."""
+    return date(year, month, 1), date(year, month, monthrange(year, month)[1])
+
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -69,7 +201,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def authenticate(token: str, db: Session):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -88,9 +220,21 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     return user
 
 
+def get_current_user(response: Response, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    # Dépendance des routes d'écriture
+    user = authenticate(token, db)
+    pin_to_primary(user.id, response)
+    return user
+
+
+def get_current_reader(token: str = Depends(oauth2_scheme), db: Session = Depends(get_read_db)):
+    # Dépendance des routes de lecture (GET)
+    return authenticate(token, db)
+
+
 # Routes d'authentification
 @app.post("/register", response_model=UserResponse)
-def register(user: UserCreate, db: Session = Depends(get_db)):
+def register(user: UserCreate, response: Response, db: Session = Depends(get_db)):
     try:
         # Vérifier si l'utilisateur existe déjà
         db_user = db.query(User).filter(User.email == user.email).first()
@@ -110,6 +254,8 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
         db.add(db_user)
         db.commit()
         db.refresh(db_user)
+        # Le client enchaîne sur /token puis GET /users/me : lire sur la base principale
+        pin_to_primary(db_user.id, response)
         return db_user
     except HTTPException:
         raise
@@ -119,7 +265,7 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
 
 
 @app.post("/token", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+def login(response: Response, form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     user = db.query(User).filter(User.email == form_data.username).first()
     if not user or not verify_password(form_data.password, user.hashed_password):
         raise HTTPException(
@@ -131,18 +277,26 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
     access_token = create_access_token(
         data={"sub": user.id}, expires_delta=access_token_expires
     )
+    pin_to_primary(user.id, response)
     return {"access_token": access_token, "token_type": "bearer"}
 
 
 @app.get("/users/me", response_model=UserResponse)
-def read_users_me(current_user: User = Depends(get_current_user)):
+def read_users_me(current_user: User = Depends(get_current_reader)):
     return current_user
 
 
 # Routes pour les revenus
 @app.post("/incomes", response_model=IncomeResponse)
-def create_income(income: IncomeCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    db_income = Income(**income.dict(), user_id=current_user.id)
+async def create_income(income: IncomeCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    values = dict(income.dict(), user_id=current_user.id)
+    if COALESCE_WRITES:
+        return await wait_for_batch(Income, values, db)
+    return await run_in_threadpool(insert_income, db, values)
+
+
+def insert_income(db: Session, values):
+    db_income = Income(**values)
     db.add(db_income)
     db.commit()
     db.refresh(db_income)
@@ -150,13 +304,13 @@ def create_income(income: IncomeCreate, current_user: User = Depends(get_current
 
 
 @app.get("/incomes", response_model=List[IncomeResponse])
-def read_incomes(skip: int = 0, limit: int = 100, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def read_incomes(skip: int = 0, limit: int = 100, current_user: User = Depends(get_current_reader), db: Session = Depends(get_read_db)):
     incomes = db.query(Income).filter(Income.user_id == current_user.id).offset(skip).limit(limit).all()
     return incomes
 
 
 @app.get("/incomes/{income_id}", response_model=IncomeResponse)
-def read_income(income_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def read_income(income_id: int, current_user: User = Depends(get_current_reader), db: Session = Depends(get_read_db)):
     income = db.query(Income).filter(Income.id == income_id, Income.user_id == current_user.id).first()
     if income is None:
         raise HTTPException(status_code=404, detail="Income not found")
@@ -187,22 +341,30 @@ def delete_income(income_id: int, current_user: User = Depends(get_current_user)
 
 # Routes pour les dépenses
 @app.post("/expenses", response_model=ExpenseResponse)
-def create_expense(expense: ExpenseCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    db_expense = Expense(**expense.dict(), user_id=current_user.id)
+async def create_expense(expense: ExpenseCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    values = dict(expense.dict(), user_id=current_user.id)
+    if COALESCE_WRITES:
+        return await wait_for_batch(Expense, values, db)
+    return await run_in_threadpool(insert_expense, db, values)
+
+
+def insert_expense(db: Session, values):
+    db_expense = Expense(**values)
     db.add(db_expense)
+    insights.touch(db, values["user_id"])
     db.commit()
     db.refresh(db_expense)
     return db_expense
 
 
 @app.get("/expenses", response_model=List[ExpenseResponse])
-def read_expenses(skip: int = 0, limit: int = 100, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def read_expenses(skip: int = 0, limit: int = 100, current_user: User = Depends(get_current_reader), db: Session = Depends(get_read_db)):
     expenses = db.query(Expense).filter(Expense.user_id == current_user.id).offset(skip).limit(limit).all()
     return expenses
 
 
 @app.get("/expenses/{expense_id}", response_model=ExpenseResponse)
-def read_expense(expense_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def read_expense(expense_id: int, current_user: User = Depends(get_current_reader), db: Session = Depends(get_read_db)):
     expense = db.query(Expense).filter(Expense.id == expense_id, Expense.user_id == current_user.id).first()
     if expense is None:
         raise HTTPException(status_code=404, detail="Expense not found")
@@ -216,6 +378,7 @@ def update_expense(expense_id: int, expense: ExpenseUpdate, current_user: User =
         raise HTTPException(status_code=404, detail="Expense not found")
     for key, value in expense.dict(exclude_unset=True).items():
         setattr(db_expense, key, value)
+    insights.touch(db, current_user.id)
     db.commit()
     db.refresh(db_expense)
     return db_expense
@@ -227,6 +390,7 @@ def delete_expense(expense_id: int, current_user: User = Depends(get_current_use
     if expense is None:
         raise HTTPException(status_code=404, detail="Expense not found")
     db.delete(expense)
+    insights.touch(db, current_user.id)
     db.commit()
     return {"message": "Expense deleted successfully"}
 
@@ -242,7 +406,7 @@ def create_budget(budget: BudgetCreate, current_user: User = Depends(get_current
 
 
 @app.get("/budgets", response_model=List[BudgetResponse])
-def read_budgets(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def read_budgets(current_user: User = Depends(get_current_reader), db: Session = Depends(get_read_db)):
     budgets = db.query(Budget).filter(Budget.user_id == current_user.id).all()
     return budgets
 
@@ -280,7 +444,7 @@ def create_savings_goal(goal: SavingsGoalCreate, current_user: User = Depends(ge
 
 
 @app.get("/savings-goals", response_model=List[SavingsGoalResponse])
-def read_savings_goals(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def read_savings_goals(current_user: User = Depends(get_current_reader), db: Session = Depends(get_read_db)):
     goals = db.query(SavingsGoal).filter(SavingsGoal.user_id == current_user.id).all()
     return goals
 
@@ -307,77 +471,114 @@ def delete_savings_goal(goal_id: int, current_user: User = Depends(get_current_u
     return {"message": "Savings goal deleted successfully"}
 
 
+# Routes pour les transactions récurrentes
+@app.post("/recurring-rules", response_model=RecurringRuleResponse)
+def create_recurring_rule(rule: RecurringRuleCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    db_rule = RecurringRule(**rule.dict(), user_id=current_user.id)
+    db.add(db_rule)
+    db.commit()
+    db.refresh(db_rule)
+    return db_rule
+
+
+@app.get("/recurring-rules", response_model=List[RecurringRuleResponse])
+def read_recurring_rules(current_user: User = Depends(get_current_reader), db: Session = Depends(get_read_db)):
+    rules = db.query(RecurringRule).filter(RecurringRule.user_id == current_user.id).all()
+    return rules
+
+
+@app.put("/recurring-rules/{rule_id}", response_model=RecurringRuleResponse)
+def update_recurring_rule(rule_id: int, rule: RecurringRuleUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    db_rule = db.query(RecurringRule).filter(RecurringRule.id == rule_id, RecurringRule.user_id == current_user.id).first()
+    if db_rule is None:
+        raise HTTPException(status_code=404, detail="Recurring rule not found")
+    recurring.update_rule(db_rule, rule.dict(exclude_unset=True))
+    db.commit()
+    db.refresh(db_rule)
+    return db_rule
+
+
+@app.delete("/recurring-rules/{rule_id}")
+def delete_recurring_rule(rule_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    rule = db.query(RecurringRule).filter(RecurringRule.id == rule_id, RecurringRule.user_id == current_user.id).first()
+    if rule is None:
+        raise HTTPException(status_code=404, detail="Recurring rule not found")
+    # Les transactions déjà créées sont conservées
+    db.query(RecurringOccurrence).filter(RecurringOccurrence.rule_id == rule.id).delete()
+    db.delete(rule)
+    db.commit()
+    return {"message": "Recurring rule deleted successfully"}
+
+
 # Route pour le dashboard
 @app.get("/dashboard", response_model=DashboardStats)
-def get_dashboard(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    from sqlalchemy import func, extract
-    from datetime import datetime
-    
-    # Revenus totaux
-    total_income = db.query(func.sum(Income.amount)).filter(Income.user_id == current_user.id).scalar() or 0
+def get_dashboard(project: bool = False, current_user: User = Depends(get_current_reader), db: Session = Depends(get_read_db)):
+    from sqlalchemy import func
     
-    # Dépenses totales
-    total_expenses = db.query(func.sum(Expense.amount)).filter(Expense.user_id == current_user.id).scalar() or 0
+    # Totaux (tables chaudes + totaux annuels précalculés des archives)
+    total_income = archive.total_amount(db, Income, current_user.id)
+    total_expenses = archive.total_amount(db, Expense, current_user.id)
     
     # Solde actuel
     balance = total_income - total_expenses
     
-    # Revenus du mois en cours
-    current_month = datetime.now().month
-    current_year = datetime.now().year
-    monthly_income = db.query(func.sum(Income.amount)).filter(
-        Income.user_id == current_user.id,
-        extract('month', Income.date) == current_month,
-        extract('year', Income.date) == current_year
-    ).scalar() or 0
-    
-    # Dépenses du mois en cours
-    monthly_expenses = db.query(func.sum(Expense.amount)).filter(
-        Expense.user_id == current_user.id,
-        extract('month', Expense.date) == current_month,
-        extract('year', Expense.date) == current_year
-    ).scalar() or 0
+    # Revenus et dépenses du mois en cours
+    today = date.today()
+    month_start, month_end = month_bounds(today.year, today.month)
+    monthly_income = archive.total_amount(db, Income, current_user.id, month_start, month_end)
+    monthly_expenses = archive.total_amount(db, Expense, current_user.id, month_start, month_end)
     
-    # Dépenses par catégorie
+    # Dépenses par catégorie (le mois en cours n'est jamais archivé)
     category_expenses = db.query(
         Expense.category,
         func.sum(Expense.amount).label('total')
     ).filter(
         Expense.user_id == current_user.id,
-        extract('month', Expense.date) == current_month,
-        extract('year', Expense.date) == current_year
+        Expense.date >= month_start,
+        Expense.date <= month_end
     ).group_by(Expense.category).all()
     
     category_stats = [CategoryStats(category=cat, amount=float(amt)) for cat, amt in category_expenses]
     
-    # Évolution mensuelle (6 derniers mois)
-    monthly_evolution = []
-    for i in range(6):
-        month = current_month - i
-        year = current_year
-        if month <= 0:
-            month += 12
-            year -= 1
-        
-        month_income = db.query(func.sum(Income.amount)).filter(
-            Income.user_id == current_user.id,
-            extract('month', Income.date) == month,
-            extract('year', Income.date) == year
-        ).scalar() or 0
-        
-        month_expenses = db.query(func.sum(Expense.amount)).filter(
-            Expense.user_id == current_user.id,
-            extract('month', Expense.date) == month,
-            extract('year', Expense.date) == year
-        ).scalar() or 0
-        
-        monthly_evolution.append({
-            "month": f"{year}-{month:02d}",
-            "income": float(month_income),
-            "expenses": float(month_expenses)
-        })
+    # Évolution mensuelle (6 derniers mois), en une requête groupée
+    first_year, first_month = divmod(today.year * 12 + today.month - 1 - 5, 12)
+    periods, series = aggregation.aggregate(
+        db, current_user.id, date(first_year, first_month + 1, 1), month_end, "month", "kind"
+    )
+    values = {serie["kind"]: serie["values"] for serie in series}
+    monthly_evolution = [
+        {
+            "month": period.strftime("%Y-%m"),
+            "income": values["income"][i],
+            "expenses": values["expense"][i]
+        }
+        for i, period in enumerate(periods)
+    ]
     
-    monthly_evolution.reverse()
+    # Projection des occurrences récurrentes non encore matérialisées
+    projected_monthly_income = None
+    projected_monthly_expenses = None
+    if project:
+        months_ahead = []
+        for i in range(PROJECTION_MONTHS + 1):
+            year, month = divmod(today.year * 12 + today.month - 1 + i, 12)
+            months_ahead.append(f"{year}-{month + 1:02d}")
+        projected_totals = {key: {"income": 0.0, "expenses": 0.0} for key in months_ahead}
+        horizon_end = month_bounds(int(months_ahead[-1][:4]), int(months_ahead[-1][5:]))[1]
+        for occurrence in recurring.project(db, current_user.id, month_start, horizon_end):
+            totals = projected_totals[occurrence["date"].strftime("%Y-%m")]
+            totals["income" if occurrence["kind"] == "income" else "expenses"] += occurrence["amount"]
+        
+        current = projected_totals[months_ahead[0]]
+        projected_monthly_income = float(monthly_income) + current["income"]
+        projected_monthly_expenses = float(monthly_expenses) + current["expenses"]
+        for key in months_ahead[1:]:
+            monthly_evolution.append({
+                "month": key,
+                "income": projected_totals[key]["income"],
+                "expenses": projected_totals[key]["expenses"],
+                "projected": True
+            })
     
     # Indicateur de santé financière
     if monthly_expenses > 0:
@@ -401,13 +602,45 @@ def get_dashboard(current_user: User = Depends(get_current_user), db: Session =
         monthly_expenses=float(monthly_expenses),
         category_stats=category_stats,
         monthly_evolution=monthly_evolution,
-        health_status=health_status
+        health_status=health_status,
+        projected_monthly_income=projected_monthly_income,
+        projected_monthly_expenses=projected_monthly_expenses
     )
 
 
+# Route pour l'agrégation par intervalles de temps
+@app.get("/aggregate", response_model=AggregateResponse)
+def get_aggregate(
+    start: date = Query(..., alias="from"),
+    end: Optional[date] = Query(None, alias="to"),
+    bucket: Literal["day", "week", "month", "quarter", "year"] = "month",
+    group_by: Literal["category", "kind"] = "kind",
+    kind: Optional[Literal["income", "expense"]] = None,
+    current_user: User = Depends(get_current_reader),
+    db: Session = Depends(get_read_db)
+):
+    end = end or date.today()
+    if start > end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+    if aggregation.bucket_count(start, end, bucket) > aggregation.MAX_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many buckets (max {aggregation.MAX_BUCKETS}), use a larger bucket or a shorter range"
+        )
+    kinds = (kind,) if kind else ("income", "expense")
+    periods, series = aggregation.aggregate(db, current_user.id, start, end, bucket, group_by, kinds)
+    return AggregateResponse(bucket=bucket, group_by=group_by, periods=periods, series=series)
+
+
+# Route pour l'analyse des dépenses
+@app.get("/insights", response_model=InsightsResponse)
+def get_insights(current_user: User = Depends(get_current_reader), db: Session = Depends(get_read_db)):
+    return insights.get_insights(db, current_user.id)
+
+
 # Route pour export CSV
 @app.get("/export/csv")
-def export_csv(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def export_csv(current_user: User = Depends(get_current_reader), db: Session = Depends(get_read_db)):
     from fastapi.responses import StreamingResponse
     import io
     import csv
@@ -419,12 +652,12 @@ def export_csv(current_user: User = Depends(get_current_user), db: Session = Dep
     writer.writerow(["Type", "Date", "Catégorie", "Montant", "Commentaire"])
     
     # Revenus
-    incomes = db.query(Income).filter(Income.user_id == current_user.id).all()
+    incomes = archive.iter_rows(db, Income, current_user.id)
     for income in incomes:
         writer.writerow(["Revenu", income.date.strftime("%Y-%m-%d"), income.category, income.amount, ""])
     
     # Dépenses
-    expenses = db.query(Expense).filter(Expense.user_id == current_user.id).all()
+    expenses = archive.iter_rows(db, Expense, current_user.id)
     for expense in expenses:
         writer.writerow(["Dépense", expense.date.strftime("%Y-%m-%d"), expense.category, expense.amount, expense.comment or ""])
     
@@ -439,7 +672,7 @@ def export_csv(current_user: User = Depends(get_current_user), db: Session = Dep
 
 # Route pour export Excel
 @app.get("/export/excel")
-def export_excel(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def export_excel(current_user: User = Depends(get_current_reader), db: Session = Depends(get_read_db)):
     from fastapi.responses import StreamingResponse
     from openpyxl import Workbook
     from openpyxl.styles import Font, PatternFill
@@ -461,12 +694,12 @@ def export_excel(current_user: User = Depends(get_current_user), db: Session = D
         cell.font = header_font
     
     # Revenus
-    incomes = db.query(Income).filter(Income.user_id == current_user.id).all()
+    incomes = archive.iter_rows(db, Income, current_user.id)
     for income in incomes:
         ws.append(["Revenu", income.date, income.category, income.amount, ""])
     
     # Dépenses
-    expenses = db.query(Expense).filter(Expense.user_id == current_user.id).all()
+    expenses = archive.iter_rows(db, Expense, current_user.id)
     for expense in expenses:
         ws.append(["Dépense", expense.date, expense.category, expense.amount, expense.comment or ""])
     
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, Text, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Float, Date, Text, ForeignKey, DateTime, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -17,6 +17,7 @@ class User(Base):
     expenses = relationship("Expense", back_populates="user")
     budgets = relationship("Budget", back_populates="user")
     savings_goals = relationship("SavingsGoal", back_populates="user")
+    recurring_rules = relationship("RecurringRule", back_populates="user")
 
 
 class Income(Base):
@@ -30,6 +31,9 @@ class Income(Base):
 
     user = relationship("User", back_populates="incomes")
 
+    # AUTOINCREMENT : un identifiant n'est jamais réattribué après archivage
+    __table_args__ = {"sqlite_autoincrement": True}
+
 
 class Expense(Base):
     __tablename__ = "expenses"
@@ -43,6 +47,9 @@ class Expense(Base):
 
     user = relationship("User", back_populates="expenses")
 
+    # AUTOINCREMENT : un identifiant n'est jamais réattribué après archivage
+    __table_args__ = {"sqlite_autoincrement": True}
+
 
 class Budget(Base):
     __tablename__ = "budgets"
@@ -68,3 +75,91 @@ class SavingsGoal(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
 
     user = relationship("User", back_populates="savings_goals")
+
+
+class RecurringRule(Base):
+    __tablename__ = "recurring_rules"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)  # income, expense
+    amount = Column(Float, nullable=False)
+    category = Column(String, nullable=False)
+    comment = Column(Text, nullable=True)
+    # Planification façon RRULE : FREQ, INTERVAL, DTSTART, UNTIL
+    frequency = Column(String, nullable=False)  # DAILY, WEEKLY, MONTHLY, YEARLY
+    interval = Column(Integer, nullable=False, default=1)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=True)
+    materialized_until = Column(Date, nullable=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+
+    user = relationship("User", back_populates="recurring_rules")
+
+
+class RecurringOccurrence(Base):
+    __tablename__ = "recurring_occurrences"
+
+    id = Column(Integer, primary_key=True, index=True)
+    rule_id = Column(Integer, ForeignKey("recurring_rules.id"), nullable=False)
+    occurrence_date = Column(Date, nullable=False)
+
+    __table_args__ = (UniqueConstraint("rule_id", "occurrence_date"),)
+
+
+# Archives froides : les années closes sont déplacées hors des tables chaudes
+class IncomeArchive(Base):
+    __tablename__ = "income_archive"
+
+    id = Column(Integer, primary_key=True)
+    original_id = Column(Integer, nullable=False)  # identifiant dans la table chaude
+    amount = Column(Float, nullable=False)
+    category = Column(String, nullable=False)
+    date = Column(Date, nullable=False)
+    year = Column(Integer, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+
+    __table_args__ = (Index("ix_income_archive_user_year", "user_id", "year"),)
+
+
+class ExpenseArchive(Base):
+    __tablename__ = "expense_archive"
+
+    id = Column(Integer, primary_key=True)
+    original_id = Column(Integer, nullable=False)  # identifiant dans la table chaude
+    amount = Column(Float, nullable=False)
+    category = Column(String, nullable=False)
+    date = Column(Date, nullable=False)
+    comment = Column(Text, nullable=True)
+    year = Column(Integer, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+
+    __table_args__ = (Index("ix_expense_archive_user_year", "user_id", "year"),)
+
+
+class YearlyTotal(Base):
+    __tablename__ = "yearly_totals"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    year = Column(Integer, nullable=False)
+    kind = Column(String, nullable=False)  # income, expense
+    category = Column(String, nullable=False)
+    total = Column(Float, nullable=False, default=0.0)
+    count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (UniqueConstraint("user_id", "year", "kind", "category"),)
+
+
+class ArchivedYear(Base):
+    __tablename__ = "archived_years"
+
+    year = Column(Integer, primary_key=True)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+
+    # Incrémenté à chaque écriture de dépense : sert de clé au cache de /insights
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
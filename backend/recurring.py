@@ -0,0 +1,201 @@
+"""
+Transactions récurrentes (salaires, loyers, abonnements...).
+
+Une règle `RecurringRule` décrit une planification façon RRULE
+(FREQ / INTERVAL / DTSTART / UNTIL). Le planificateur matérialise en une
+seule passe ensembliste toutes les occurrences échues de tous les
+utilisateurs : les revenus / dépenses sont insérés en masse et chaque
+occurrence est enregistrée dans `recurring_occurrences`, dont la contrainte
+d'unicité (règle, date) rend l'opération idempotente. Les occurrences sont
+insérées avec ON CONFLICT DO NOTHING et seules celles effectivement créées
+donnent lieu à une transaction : plusieurs passes concurrentes (un
+planificateur par worker, `python recurring.py`...) ne créent pas de doublon.
+
+Les occurrences futures peuvent aussi être projetées sans être écrites.
+
+Usage :
+    python recurring.py              # matérialise jusqu'à aujourd'hui
+    python recurring.py 2026-12-31   # matérialise jusqu'à une date donnée
+"""
+
+import sys
+from calendar import monthrange
+from datetime import date, timedelta
+
+from sqlalchemy import insert, update, bindparam, or_
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database import SessionLocal, engine, Base
+from models import Income, Expense, RecurringRule, RecurringOccurrence
+import insights
+
+TRANSACTION_MODELS = {"income": Income, "expense": Expense}
+MONTHS_PER_STEP = {"MONTHLY": 1, "YEARLY": 12}
+DAYS_PER_STEP = {"DAILY": 1, "WEEKLY": 7}
+
+
+def _add_months(day, months, anchor_day):
+    month_index = day.year * 12 + day.month - 1 + months
+    year, month = divmod(month_index, 12)
+    month += 1
+    # 31 janvier + 1 mois -> 28/29 février, puis retour au 31 quand possible
+    return date(year, month, min(anchor_day, monthrange(year, month)[1]))
+
+
+def occurrences(rule, start, end):
+    """Dates d'occurrence de la règle comprises dans [start, end]."""
+    first = max(start, rule.start_date)
+    if rule.end_date is not None:
+        end = min(end, rule.end_date)
+    if first > end:
+        return []
+
+    interval = rule.interval or 1
+    dates = []
+    if rule.frequency in DAYS_PER_STEP:
+        step = DAYS_PER_STEP[rule.frequency] * interval
+        # Premier pas >= first, calculé sans itérer depuis start_date
+        n = -(-(first - rule.start_date).days // step)
+        current = rule.start_date + timedelta(days=n * step)
+        while current <= end:
+            dates.append(current)
+            current += timedelta(days=step)
+    else:
+        step = MONTHS_PER_STEP[rule.frequency] * interval
+        anchor = rule.start_date
+        elapsed = (first.year - anchor.year) * 12 + first.month - anchor.month
+        n = max(elapsed // step, 0)
+        while True:
+            current = _add_months(anchor, n * step, anchor.day)
+            if current > end:
+                break
+            if current >= first:
+                dates.append(current)
+            n += 1
+    return dates
+
+
+def _pending_start(rule):
+    if rule.materialized_until is None:
+        return rule.start_date
+    return rule.materialized_until + timedelta(days=1)
+
+
+def _materialized_until(rule, until):
+    # Ne jamais marquer comme traité ce qui suit la date de fin : si elle est
+    # repoussée plus tard, ces occurrences devront encore être créées
+    if rule.end_date is not None:
+        return min(until, rule.end_date)
+    return until
+
+
+def update_rule(rule, values):
+    """Applique les modifications à la règle et recule `materialized_until` si besoin.
+
+    Une date de fin repoussée rouvre la période qui la suivait : les occurrences
+    déjà créées sont ignorées par ON CONFLICT lors de la prochaine passe.
+    """
+    previous_end_date = rule.end_date
+    for key, value in values.items():
+        setattr(rule, key, value)
+    if previous_end_date is not None and rule.end_date != previous_end_date and rule.materialized_until is not None:
+        rule.materialized_until = min(rule.materialized_until, previous_end_date)
+
+
+def materialize_due(db, until=None):
+    """Matérialise toutes les occurrences échues jusqu'à `until` (inclus).
+
+    Renvoie le nombre de transactions créées.
+    """
+    until = until or date.today()
+    rules = db.query(RecurringRule).filter(
+        RecurringRule.start_date <= until,
+        or_(RecurringRule.materialized_until.is_(None), RecurringRule.materialized_until < until),
+        or_(RecurringRule.end_date.is_(None), RecurringRule.materialized_until.is_(None),
+            RecurringRule.materialized_until < RecurringRule.end_date)
+    ).all()
+    if not rules:
+        return 0
+
+    due = {rule.id: occurrences(rule, _pending_start(rule), until) for rule in rules}
+
+    # Occurrences déjà présentes (exécution interrompue ou concurrente)
+    window_start = min(_pending_start(rule) for rule in rules)
+    existing = set(db.query(RecurringOccurrence.rule_id, RecurringOccurrence.occurrence_date).filter(
+        RecurringOccurrence.rule_id.in_(list(due)),
+        RecurringOccurrence.occurrence_date >= window_start
+    ).all())
+
+    rules_by_id = {rule.id: rule for rule in rules}
+    candidates = [
+        {"rule_id": rule.id, "occurrence_date": day}
+        for rule in rules
+        for day in due[rule.id]
+        if (rule.id, day) not in existing
+    ]
+
+    created = []
+    if candidates:
+        # Une passe concurrente a pu insérer les mêmes occurrences entre-temps :
+        # on ne récupère que les lignes réellement créées par cette passe
+        dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+        statement = dialect.insert(RecurringOccurrence).on_conflict_do_nothing(
+            index_elements=["rule_id", "occurrence_date"]
+        ).returning(RecurringOccurrence.rule_id, RecurringOccurrence.occurrence_date)
+        created = db.execute(statement, candidates).all()
+
+    transactions = {kind: [] for kind in TRANSACTION_MODELS}
+    users = set()
+    for rule_id, day in created:
+        rule = rules_by_id[rule_id]
+        values = {"amount": rule.amount, "category": rule.category, "date": day, "user_id": rule.user_id}
+        if rule.kind == "expense":
+            values["comment"] = rule.comment
+            users.add(rule.user_id)
+        transactions[rule.kind].append(values)
+
+    for kind, rows in transactions.items():
+        if rows:
+            db.execute(insert(TRANSACTION_MODELS[kind]), rows)
+    for user_id in users:
+        insights.touch(db, user_id)
+
+    db.execute(
+        update(RecurringRule.__table__).where(RecurringRule.id == bindparam("rule_id")),
+        [{"rule_id": rule.id, "materialized_until": _materialized_until(rule, until)} for rule in rules]
+    )
+    db.commit()
+    return len(created)
+
+
+def project(db, user_id, start, end):
+    """Occurrences futures non matérialisées de l'utilisateur, sans écriture.
+
+    Renvoie une liste de dictionnaires (kind, date, amount, category).
+    """
+    rules = db.query(RecurringRule).filter(
+        RecurringRule.user_id == user_id,
+        RecurringRule.start_date <= end,
+        or_(RecurringRule.end_date.is_(None), RecurringRule.end_date >= start)
+    ).all()
+    projected = []
+    for rule in rules:
+        for day in occurrences(rule, max(start, _pending_start(rule)), end):
+            projected.append({"kind": rule.kind, "date": day, "amount": rule.amount, "category": rule.category})
+    return projected
+
+
+def main(argv):
+    until = date.fromisoformat(argv[0]) if argv else date.today()
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        created = materialize_due(db, until)
+    finally:
+        db.close()
+    print(f"{created} transactions récurrentes créées jusqu'au {until.isoformat()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from pydantic import BaseModel, EmailStr, Field
+from typing import Optional, List, Literal
 from datetime import date, datetime
 
 
@@ -130,6 +130,44 @@ class SavingsGoalResponse(BaseModel):
         from_attributes = True
 
 
+# Recurring rule schemas
+class RecurringRuleCreate(BaseModel):
+    kind: Literal["income", "expense"]
+    amount: float
+    category: str
+    comment: Optional[str] = None
+    frequency: Literal["DAILY", "WEEKLY", "MONTHLY", "YEARLY"]
+    interval: int = Field(1, ge=1)
+    start_date: date
+    end_date: Optional[date] = None
+
+
+class RecurringRuleUpdate(BaseModel):
+    amount: Optional[float] = None
+    category: Optional[str] = None
+    comment: Optional[str] = None
+    frequency: Optional[Literal["DAILY", "WEEKLY", "MONTHLY", "YEARLY"]] = None
+    interval: Optional[int] = Field(None, ge=1)
+    end_date: Optional[date] = None
+
+
+class RecurringRuleResponse(BaseModel):
+    id: int
+    kind: str
+    amount: float
+    category: str
+    comment: Optional[str]
+    frequency: str
+    interval: int
+    start_date: date
+    end_date: Optional[date]
+    materialized_until: Optional[date]
+    user_id: int
+
+    class Config:
+        from_attributes = True
+
+
 # Dashboard schemas
 class CategoryStats(BaseModel):
     category: str
@@ -151,3 +189,68 @@ class DashboardStats(BaseModel):
     category_stats: List[CategoryStats]
     monthly_evolution: List[dict]
     health_status: str
+    projected_monthly_income: Optional[float] = None
+    projected_monthly_expenses: Optional[float] = None
+
+
+# Insights schemas
+class CategoryInsight(BaseModel):
+    category: str
+    count: int
+    average: float
+    current_month: float
+    rolling_mean: Optional[float]
+    rolling_std: Optional[float]
+
+
+class AnomalousMonth(BaseModel):
+    month: str
+    category: str
+    amount: float
+    expected: float
+    z_score: float
+
+
+class AnomalousTransaction(BaseModel):
+    id: int
+    date: date
+    category: str
+    amount: float
+    z_score: float
+
+
+class RecurringCharge(BaseModel):
+    category: str
+    amount: float
+    period: str
+    occurrences: int
+    last_date: date
+    next_date: date
+
+
+class CategoryForecast(BaseModel):
+    month: str
+    category: str
+    amount: float
+
+
+class InsightsResponse(BaseModel):
+    categories: List[CategoryInsight]
+    anomalous_months: List[AnomalousMonth]
+    anomalous_transactions: List[AnomalousTransaction]
+    recurring: List[RecurringCharge]
+    forecast: List[CategoryForecast]
+
+
+# Aggregation schemas
+class AggregateSeries(BaseModel):
+    kind: str
+    category: Optional[str]
+    values: List[float]
+
+
+class AggregateResponse(BaseModel):
+    bucket: str
+    group_by: str
+    periods: List[date]
+    series: List[AggregateSeries]
@@ -0,0 +1,49 @@
+"""
+Test de non-régression de l'archivage : archiver, réinsérer, archiver encore.
+
+Usage : python -m pytest test_archive.py
+"""
+
+from datetime import date
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import archive
+from database import Base
+from models import User, Expense, ExpenseArchive
+
+
+def make_session():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+
+def test_archive_insert_archive_again():
+    db = make_session()
+    user = User(email="archive@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+
+    db.add_all([
+        Expense(amount=10, category="Food", date=date(2023, 3, 1), user_id=user.id),
+        Expense(amount=20, category="Food", date=date(2024, 5, 1), user_id=user.id),
+    ])
+    db.commit()
+    archived_id = db.query(Expense.id).filter(Expense.date == date(2024, 5, 1)).scalar()
+    assert archive.archive_year(db, 2024) == 1
+
+    # L'identifiant le plus élevé vient d'être archivé : il ne doit pas être réattribué
+    late = Expense(amount=5, category="Food", date=date(2023, 12, 31), user_id=user.id)
+    db.add(late)
+    db.commit()
+    assert late.id != archived_id
+
+    assert archive.archive_year(db, 2023) == 2
+    original_ids = {row.original_id for row in db.query(ExpenseArchive).all()}
+    assert len(original_ids) == 3
+    assert archive.total_amount(db, Expense, user.id) == 35
@@ -0,0 +1,83 @@
+"""
+Tests des règles récurrentes : calcul des occurrences et matérialisation.
+
+Usage : python -m pytest test_recurring.py
+"""
+
+from datetime import date
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import recurring
+from database import Base
+from models import User, Expense, RecurringRule
+
+
+def make_session():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+
+def make_rule(db, **values):
+    user = User(email="recurring@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    rule = RecurringRule(kind="expense", amount=10, category="Abonnements", user_id=user.id, **values)
+    db.add(rule)
+    db.commit()
+    return rule
+
+
+def test_monthly_occurrences_clamped_to_month_end():
+    rule = RecurringRule(frequency="MONTHLY", interval=1, start_date=date(2027, 1, 31))
+    assert recurring.occurrences(rule, date(2027, 1, 1), date(2027, 5, 31)) == [
+        date(2027, 1, 31), date(2027, 2, 28), date(2027, 3, 31), date(2027, 4, 30), date(2027, 5, 31),
+    ]
+    # Fenêtre commençant en cours de route : toujours ancrée sur le 31
+    assert recurring.occurrences(rule, date(2028, 2, 1), date(2028, 3, 31)) == [date(2028, 2, 29), date(2028, 3, 31)]
+
+
+def test_monthly_interval_and_yearly_leap_day():
+    rule = RecurringRule(frequency="MONTHLY", interval=2, start_date=date(2026, 12, 31))
+    assert recurring.occurrences(rule, date(2027, 1, 1), date(2027, 6, 30)) == [date(2027, 2, 28), date(2027, 4, 30), date(2027, 6, 30)]
+
+    rule = RecurringRule(frequency="YEARLY", interval=1, start_date=date(2024, 2, 29))
+    assert recurring.occurrences(rule, date(2024, 1, 1), date(2028, 12, 31)) == [
+        date(2024, 2, 29), date(2025, 2, 28), date(2026, 2, 28), date(2027, 2, 28), date(2028, 2, 29),
+    ]
+
+
+def test_extended_end_date_materializes_missed_occurrences():
+    db = make_session()
+    rule = make_rule(db, frequency="WEEKLY", interval=1, start_date=date(2026, 6, 1), end_date=date(2026, 6, 30))
+    assert recurring.materialize_due(db, date(2026, 10, 19)) == 5
+    assert rule.materialized_until == date(2026, 6, 30)
+
+    recurring.update_rule(rule, {"end_date": date(2026, 12, 31)})
+    db.commit()
+    projected = recurring.project(db, rule.user_id, date(2026, 10, 20), date(2026, 10, 31))
+    assert [p["date"] for p in projected] == [date(2026, 10, 26)]
+
+    # Les 16 lundis du 6 juillet au 19 octobre
+    assert recurring.materialize_due(db, date(2026, 10, 19)) == 16
+    assert db.query(func.max(Expense.date)).scalar() == date(2026, 10, 19)
+    assert db.query(Expense).count() == 21
+
+
+def test_end_date_change_rewinds_rule_materialized_past_it():
+    # Règle matérialisée au-delà de sa date de fin (données antérieures à la correction)
+    db = make_session()
+    rule = make_rule(db, frequency="WEEKLY", interval=1, start_date=date(2026, 6, 1), end_date=date(2026, 6, 30),
+                     materialized_until=date(2026, 10, 19))
+
+    recurring.update_rule(rule, {"end_date": date(2026, 12, 31)})
+    assert rule.materialized_until == date(2026, 6, 30)
+    recurring.update_rule(rule, {"amount": 12})
+    assert rule.materialized_until == date(2026, 6, 30)
+    db.commit()
+    assert recurring.materialize_due(db, date(2026, 10, 19)) == 16
@@ -29,8 +29,7 @@ ChartJS.register(
 
 function Statistics() {
   const [stats, setStats] = useState(null);
-  const [incomes, setIncomes] = useState([]);
-  const [expenses, setExpenses] = useState([]);
+  const [series, setSeries] = useState([]);
   const [loading, setLoading] = useState(true);
   const [selectedYear, setSelectedYear] = useState(new Date().getFullYear());
 
@@ -40,14 +39,20 @@ function Statistics() {
 
   const fetchData = async () => {
     try {
-      const [statsRes, incomesRes, expensesRes] = await Promise.all([
+      // Totaux mensuels par catégorie calculés côté serveur (années archivées comprises)
+      const [statsRes, aggregateRes] = await Promise.all([
         api.get('/dashboard'),
-        api.get('/incomes'),
-        api.get('/expenses')
+        api.get('/aggregate', {
+          params: {
+            from: `${selectedYear}-01-01`,
+            to: `${selectedYear}-12-31`,
+            bucket: 'month',
+            group_by: 'category'
+          }
+        })
       ]);
       setStats(statsRes.data);
-      setIncomes(incomesRes.data);
-      setExpenses(expensesRes.data);
+      setSeries(aggregateRes.data.series);
     } catch (error) {
       console.error('Error fetching data:', error);
     } finally {
@@ -59,35 +64,24 @@ function Statistics() {
     return <div className="loading">Chargement...</div>;
   }
 
-  // Données annuelles
-  const yearlyData = {};
-  const currentYear = selectedYear;
-
-  incomes.forEach(income => {
-    const year = new Date(income.date).getFullYear();
-    if (year === currentYear) {
-      const month = new Date(income.date).getMonth();
-      if (!yearlyData[month]) {
-        yearlyData[month] = { income: 0, expenses: 0 };
-      }
-      yearlyData[month].income += income.amount;
-    }
-  });
-
-  expenses.forEach(expense => {
-    const year = new Date(expense.date).getFullYear();
-    if (year === currentYear) {
-      const month = new Date(expense.date).getMonth();
-      if (!yearlyData[month]) {
-        yearlyData[month] = { income: 0, expenses: 0 };
-      }
-      yearlyData[month].expenses += expense.amount;
-    }
-  });
-
+  // Données annuelles : une série de 12 valeurs mensuelles par type et catégorie
   const months = ['Jan', 'Fév', 'Mar', 'Avr', 'Mai', 'Jun', 'Jul', 'Aoû', 'Sep', 'Oct', 'Nov', 'Déc'];
-  const monthlyIncome = months.map((_, i) => yearlyData[i]?.income || 0);
-  const monthlyExpenses = months.map((_, i) => yearlyData[i]?.expenses || 0);
+  const sumByMonth = (kind) => months.map((_, i) =>
+    series.filter(s => s.kind === kind).reduce((total, s) => total + (s.values[i] || 0), 0)
+  );
+  const monthlyIncome = sumByMonth('income');
+  const monthlyExpenses = sumByMonth('expense');
+
+  const sumByCategory = (kind) => {
+    const totals = {};
+    series.filter(s => s.kind === kind).forEach(s => {
+      const total = s.values.reduce((a, b) => a + b, 0);
+      if (total !== 0) {
+        totals[s.category] = (totals[s.category] || 0) + total;
+      }
+    });
+    return totals;
+  };
 
   const barData = {
     labels: months,
@@ -110,13 +104,7 @@ function Statistics() {
   };
 
   // Dépenses par catégorie (année complète)
-  const categoryExpenses = {};
-  expenses.forEach(expense => {
-    const year = new Date(expense.date).getFullYear();
-    if (year === currentYear) {
-      categoryExpenses[expense.category] = (categoryExpenses[expense.category] || 0) + expense.amount;
-    }
-  });
+  const categoryExpenses = sumByCategory('expense');
 
   const categoryData = {
     labels: Object.keys(categoryExpenses),
@@ -130,13 +118,7 @@ function Statistics() {
   };
 
   // Revenus par catégorie
-  const categoryIncomes = {};
-  incomes.forEach(income => {
-    const year = new Date(income.date).getFullYear();
-    if (year === currentYear) {
-      categoryIncomes[income.category] = (categoryIncomes[income.category] || 0) + income.amount;
-    }
-  });
+  const categoryIncomes = sumByCategory('income');
 
   const incomeCategoryData = {
     labels: Object.keys(categoryIncomes),
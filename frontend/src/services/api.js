@@ -7,4 +7,24 @@ const api = axios.create({
   },
 });
 
+// Après une écriture, le backend renvoie X-Primary-Pin : on le renvoie sur les
+// requêtes suivantes pour que nos lectures voient nos propres modifications,
+// quel que soit le serveur qui les traite.
+let primaryPin = null;
+
+api.interceptors.request.use((config) => {
+  if (primaryPin) {
+    config.headers['X-Primary-Pin'] = primaryPin;
+  }
+  return config;
+});
+
+api.interceptors.response.use((response) => {
+  const pin = response.headers['x-primary-pin'];
+  if (pin) {
+    primaryPin = pin;
+  }
+  return response;
+});
+
 export default api;